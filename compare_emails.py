@@ -1,5 +1,9 @@
+import os
+import time
+import traceback
 import streamlit as st
-import json
+import ijson
+import orjson
 import pandas as pd
 from datetime import datetime
 
@@ -9,47 +13,70 @@ st.set_page_config(
     layout="wide"
 )
 
-def load_json_data(file_path):
+class LazyEmailStore:
+    """Analyzer results indexed by email ID, decoded one email at a time.
+
+    The file is streamed once with ijson; each record is kept as compact
+    JSON bytes instead of Python objects and parsed only when displayed.
+    """
+
+    def __init__(self, file_path):
+        self._records = {}
+        self.labels = set()
+        with open(file_path, 'rb') as f:
+            for email_id, value in ijson.kvitems(f, '', use_float=True):
+                self.labels.update(value.get('post_labels') or [])
+                self._records[email_id] = orjson.dumps(value)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, email_id):
+        return email_id in self._records
+
+    def __getitem__(self, email_id):
+        return orjson.loads(self._records[email_id])
+
+    def keys(self):
+        return self._records.keys()
+
+@st.cache_resource(show_spinner=False)
+def load_email_store(file_path):
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return LazyEmailStore(file_path)
     except Exception as e:
         print(f"Error loading {file_path}: {str(e)}")
-        import traceback
         print(traceback.format_exc())
         return None
 
 # Load data
-openai_data = load_json_data('analyzed_emails_openai.json')
-deepseek_data = load_json_data('analyzed_emails_deepseek.json')
-llama_data = load_json_data('analyzed_emails_llama.json')
-qwen_data = load_json_data('analyzed_emails_qwen.json')
+openai_data = load_email_store('analyzed_emails_openai.json')
+deepseek_data = load_email_store('analyzed_emails_deepseek.json')
+llama_data = load_email_store('analyzed_emails_llama.json')
+qwen_data = load_email_store('analyzed_emails_qwen.json')
 
 if not openai_data:
     st.error("Failed to load OpenAI data")
     st.stop()
 
 # Create summary table
-def create_summary(data):
+@st.cache_data(show_spinner=False)
+def create_summary(file_path):
+    data = load_email_store(file_path)
     if not data:
         return {}
     
-    total_emails = len(data)
-    unique_labels = set()
-    for item in data.values():
-        unique_labels.update(item.get('post_labels', []))
-    
     return {
-        'Total Emails': total_emails,
-        'Unique Labels': len(unique_labels),
-        'Label Categories': ', '.join(sorted(unique_labels))
+        'Total Emails': len(data),
+        'Unique Labels': len(data.labels),
+        'Label Categories': ', '.join(sorted(data.labels))
     }
 
 summary_data = {
-    'OpenAI': create_summary(openai_data),
-    'DeepSeek': create_summary(deepseek_data),
-    'Llama': create_summary(llama_data),
-    'Qwen': create_summary(qwen_data)
+    'OpenAI': create_summary('analyzed_emails_openai.json'),
+    'DeepSeek': create_summary('analyzed_emails_deepseek.json'),
+    'Llama': create_summary('analyzed_emails_llama.json'),
+    'Qwen': create_summary('analyzed_emails_qwen.json')
 }
 
 # Initialize selection counts in session state
@@ -61,6 +88,14 @@ if 'model_selection_counts' not in st.session_state:
         'Qwen': 0
     }
 
+SELECTION_SUMMARY_FILE = 'selection_summary.json'
+SELECTION_FLUSH_INTERVAL = 2.0  # seconds between selection summary writes
+
+if 'selection_dirty' not in st.session_state:
+    st.session_state.selection_dirty = False
+if 'selection_last_flush' not in st.session_state:
+    st.session_state.selection_last_flush = 0.0
+
 def save_selection_summary():
     summary = {
         'timestamp': datetime.now().isoformat(),
@@ -69,12 +104,29 @@ def save_selection_summary():
         'detailed_selections': st.session_state.better_choices
     }
     try:
-        with open('selection_summary.json', 'w') as f:
-            json.dump(summary, f, indent=2)
+        # Write to a temp file and rename so a reader never sees a partial file
+        tmp_file = f"{SELECTION_SUMMARY_FILE}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_file, SELECTION_SUMMARY_FILE)
+        st.session_state.selection_dirty = False
+        st.session_state.selection_last_flush = time.time()
     except Exception as e:
         print(f"Error saving selection summary: {str(e)}")
         print(traceback.format_exc())
 
+def flush_selection_summary(force=False):
+    """Save pending selections, at most once per SELECTION_FLUSH_INTERVAL unless forced."""
+    if not st.session_state.selection_dirty:
+        return
+    if force or time.time() - st.session_state.selection_last_flush > SELECTION_FLUSH_INTERVAL:
+        save_selection_summary()
+
+@st.fragment(run_every=SELECTION_FLUSH_INTERVAL)
+def autoflush_selection_summary():
+    """Write pending selections on a timer instead of waiting for the next click."""
+    flush_selection_summary(force=True)
+
 st.title("Email Analysis Comparison")
 
 # Display summary table
@@ -82,24 +134,30 @@ st.subheader("Summary Information")
 summary_df = pd.DataFrame(summary_data)
 st.table(summary_df)
 
-# Display current selection counts
-st.subheader("Current Selection Counts")
-counts_df = pd.DataFrame([st.session_state.model_selection_counts])
-st.table(counts_df)
+if st.button("Save Selections"):
+    flush_selection_summary(force=True)
+autoflush_selection_summary()
 
 # Create comparison view
 st.subheader("Detailed Comparison")
 
 # Get common email IDs
-email_ids = set(openai_data.keys())
-if deepseek_data:
-    email_ids = email_ids.intersection(deepseek_data.keys())
-if llama_data:
-    email_ids = email_ids.intersection(llama_data.keys())
-if qwen_data:
-    email_ids = email_ids.intersection(qwen_data.keys())
-
-email_ids = sorted(email_ids)
+@st.cache_data(show_spinner=False)
+def get_common_email_ids(file_paths):
+    email_ids = None
+    for file_path in file_paths:
+        data = load_email_store(file_path)
+        if not data:
+            continue
+        email_ids = set(data.keys()) if email_ids is None else email_ids.intersection(data.keys())
+    return sorted(email_ids or [])
+
+email_ids = get_common_email_ids((
+    'analyzed_emails_openai.json',
+    'analyzed_emails_deepseek.json',
+    'analyzed_emails_llama.json',
+    'analyzed_emails_qwen.json'
+))
 total_emails = len(email_ids)
 
 def display_email(email):
@@ -116,28 +174,24 @@ def display_email(email):
         ('Confidence Score', 'confidence_score', None)
     ]
     
+    # Emit all fields as one markdown element instead of one st.write per field
+    parts = []
     for label, field, transform in fields:
         value = email.get(field, '')
         if value:
             if transform:
                 value = transform(value)
-            st.write(f"**{label}:**", value)
-
-# Display progress
-st.subheader("Progress")
-st.write(f"Showing emails: {total_emails} total")
-progress = st.progress(0)
+            parts.append(f"**{label}:** {value}")
+    if parts:
+        st.markdown("\n\n".join(parts))
 
 # Initialize better_choices if not exists
 if 'better_choices' not in st.session_state:
     st.session_state.better_choices = {}
 
-# Display data in columns
-for idx, email_id in enumerate(email_ids, 1):
-    # Update progress
-    progress.progress(idx / total_emails)
-    
-    st.markdown(f"#### Email #{idx}/{total_emails} - ID: {email_id}")
+@st.fragment
+def render_email_row(email_id, idx, total):
+    st.markdown(f"#### Email #{idx}/{total} - ID: {email_id}")
     
     # Create four columns for comparison
     cols = st.columns(4)
@@ -184,8 +238,25 @@ for idx, email_id in enumerate(email_ids, 1):
         for model in selected_models:
             st.session_state.model_selection_counts[model] += 1
         
-        # Update choices and save
+        # Update choices and mark them for saving
         st.session_state.better_choices[key] = selected_models
-        save_selection_summary()
+        st.session_state.selection_dirty = True
+    
+    flush_selection_summary()
+
+    # Display current selection counts here, so checkbox reruns of this fragment refresh them
+    st.subheader("Current Selection Counts")
+    counts_df = pd.DataFrame([st.session_state.model_selection_counts])
+    st.table(counts_df)
     
     st.markdown("---")  # Add separator between entries
+
+# Display progress
+st.subheader("Progress")
+st.write(f"Showing emails: {total_emails} total")
+
+if total_emails:
+    # Only the selected email is rendered; checkbox clicks rerun just its fragment
+    current = st.number_input("Email #", min_value=1, max_value=total_emails, value=1, step=1)
+    st.progress(current / total_emails)
+    render_email_row(email_ids[current - 1], current, total_emails)
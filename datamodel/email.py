@@ -1,7 +1,7 @@
 import traceback
 from delorean import parse
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel, Field, ConfigDict, InstanceOf, field_serializer, field_validator
 
 class EmailAnalysis(BaseModel):
@@ -75,6 +75,13 @@ class EmailAnalysis(BaseModel):
         if not value: return None
         if isinstance(value, datetime):
             return value
+        # Our own serializer writes ISO-8601, so try the fast parser first
+        try:
+            dt = datetime.fromisoformat(value)
+            # delorean treats naive values as UTC; keep doing so
+            return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            pass
         try:
             return parse(value).datetime
         except Exception as e:
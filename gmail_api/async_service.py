@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads shared by every service's a_* methods
+MAX_WORKERS = 16
+
+
+def _make_async(name: str):
+    """Create an a_<name> coroutine method that runs <name> in the shared thread pool."""
+    async def wrapper(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            AsyncGmailMixin._executor,
+            functools.partial(getattr(self, name), *args, **kwargs)
+        )
+
+    wrapper.__name__ = f"a_{name}"
+    wrapper.__qualname__ = f"a_{name}"
+    wrapper.__doc__ = f"Awaitable version of {name}, run in the shared Gmail thread pool."
+    return wrapper
+
+
+class AsyncGmailMixin:
+    """
+    Give each public method of a Gmail service class an awaitable a_<name> counterpart.
+
+    The blocking method runs in a thread pool shared by all services, so e.g.
+    await asyncio.gather(*(svc.a_get_thread(tid) for tid in ids)) fetches in parallel.
+    Generator methods are skipped, since they would still block while iterated.
+    """
+    _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gmail")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, member in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.isfunction(member) or inspect.isgeneratorfunction(member):
+                continue
+            setattr(cls, f"a_{name}", _make_async(name))
@@ -1,24 +1,49 @@
 import os
 import pickle
+import threading
 import traceback
+from functools import lru_cache
+import httplib2
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
 from hydra import initialize, compose
 
+# Socket timeout in seconds for Gmail API requests
+HTTP_TIMEOUT = 60
+
+# Retries for requests failing with 429/5xx; googleapiclient backs off exponentially with jitter
+NUM_RETRIES = 5
+
+# Credentials loaded or refreshed by get_gmail_service, reused while still valid
+_cached_creds = None
+
+
+@lru_cache(maxsize=1)
+def _load_cfg():
+    """Compose the gmail config once per process."""
+    with initialize(version_base=None, config_path="../conf"):
+        return compose(config_name="gmail")
+
+
 def get_gmail_service():
     """Get Gmail API service instance."""
+    global _cached_creds
     try:
-        with initialize(version_base=None, config_path="../conf"):
-            cfg = compose(config_name="gmail")
-            
-        creds = None
+        if _cached_creds and _cached_creds.valid:
+            return _cached_creds
+
+        cfg = _load_cfg()
+        creds = _cached_creds
         token_path = cfg.auth.token_path
         credentials_path = cfg.auth.credentials_path
         scopes = cfg.auth.scopes[0]  # Get the first scope as a string
         
         # The file token.pickle stores the user's access and refresh tokens
-        if os.path.exists(token_path):
+        if not creds and os.path.exists(token_path):
             with open(token_path, 'rb') as token:
                 creds = pickle.load(token)
         
@@ -57,6 +82,7 @@ def get_gmail_service():
             with open(token_path, 'wb') as token:
                 pickle.dump(creds, token)
 
+        _cached_creds = creds
         return creds
 
     except Exception as e:
@@ -64,3 +90,33 @@ def get_gmail_service():
         print("Stack trace:")
         print(traceback.format_exc())
         return None
+
+
+def build_gmail_service(creds):
+    """
+    Build a Gmail API client whose requests reuse a keep-alive httplib2 connection.
+
+    httplib2 connections are not thread-safe, so each thread that executes requests
+    gets its own connection from a thread-local, as the googleapiclient docs advise.
+
+    Args:
+        creds: Credentials returned by get_gmail_service
+
+    Returns:
+        Gmail API service resource
+    """
+    local = threading.local()
+
+    def thread_http():
+        http = getattr(local, 'http', None)
+        if http is None:
+            http = local.http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        return http
+
+    def build_request(_http, *args, **kwargs):
+        return HttpRequest(thread_http(), *args, **kwargs)
+
+    # These match the defaults of google-api-python-client >= 2.0; stated so an older pin cannot
+    # silently bring back the discovery round-trip and the legacy file cache
+    return build('gmail', 'v1', http=thread_http(), requestBuilder=build_request,
+                 static_discovery=True, cache_discovery=False)
@@ -1,7 +1,8 @@
 import os
 import asyncio
-import json
-from tqdm import tqdm
+import ijson
+import orjson
+from tqdm.asyncio import tqdm as async_tqdm
 import traceback
 from datetime import datetime
 from pathlib import Path
@@ -9,15 +10,18 @@ from typing import Optional, Dict, Any, List
 from promptic import llm
 import re
 from datamodel.email import EmailAnalysis
+from gmail_api.llm_cache import llm_cache
+
+LLM_MODEL = 'ollama/qwen2.5:14b-instruct-q8_0'
 
 SYSTEM_PROMPT = """You are an AI assistant that analyzes email content and provides structured analysis.
 In order to keep bilingual support, you need to analyze the email in both Chinese and English.
 If the emall is in Chinese, you need translate it to English. If the email is in English, you need translate it to Chinese.
 Your task is to analyze the email and provide:
 1. source_language: The original language of the email content (e.g., 'en' for English, 'cn' for Chinese)
-2. if source_language is Chinese('cn'), post_content_cn will be orignal content removed any links, post_summary_cn will be a concise summary for post_content_cn, post_content_en will be translate post_content_cn to English, post_summary_en will be a concise summary for post_content_en.
-3. if source_language is English('en'), post_content_en will be orignal content removed any links, post_summary_en will be a concise summary for post_content_en, post_content_cn will be translate post_content_en to Chinese, post_summary_cn will be a concise summary for post_content_cn.
-4. link_lists: Extract any URLs or links from the original email content
+2. if source_language is Chinese('cn'), post_content_cn will be orignal content, post_summary_cn will be a concise summary for post_content_cn, post_content_en will be translate post_content_cn to English, post_summary_en will be a concise summary for post_content_en.
+3. if source_language is English('en'), post_content_en will be orignal content, post_summary_en will be a concise summary for post_content_en, post_content_cn will be translate post_content_en to Chinese, post_summary_cn will be a concise summary for post_content_cn.
+4. link_lists: Leave empty; links are already removed from the content and extracted separately
 5. post_datetime: The timestamp when the email was sent or received
 
 Return the analysis in JSON format.
@@ -40,9 +44,12 @@ Rules:
 2. Return ONLY the translated content, nothing else
 """
 
+@llm_cache(LLM_MODEL, SYSTEM_PROMPT,
+           encode=lambda analysis: analysis.model_dump_json(),
+           decode=EmailAnalysis.model_validate_json)
 @llm(
     #model='ollama/llama3.1:8b-instruct-fp16', 
-    model='ollama/qwen2.5:14b-instruct-q8_0',
+    model=LLM_MODEL,
     #model='deepseek/deepseek-chat',
     api_base='http://192.168.8.120:11434',
     temperature=0,
@@ -56,9 +63,10 @@ def get_email_analysis(content: str) -> EmailAnalysis:
 
 
 
+@llm_cache(LLM_MODEL, TRANSLATE_FROM_EN_TO_CN_SYSTEM_PROMPT)
 @llm(
     #model='ollama/qwen2.5:14b-instruct-fp16',
-    model='ollama/qwen2.5:14b-instruct-q8_0',
+    model=LLM_MODEL,
     api_base='http://192.168.8.120:11434',
     temperature=0,
     top_p=0.1,
@@ -74,9 +82,10 @@ def translate_from_en_to_cn(content: str) -> str:
     Return ONLY the translated content, nothing else.
     """
 
+@llm_cache(LLM_MODEL, TRANSLATE_FROM_CN_TO_EN_SYSTEM_PROMPT)
 @llm(
     #model='ollama/qwen2.5:14b-instruct-fp16',
-    model='ollama/qwen2.5:14b-instruct-q8_0',
+    model=LLM_MODEL,
     api_base='http://192.168.8.120:11434',
     temperature=0,
     top_p=0.1,
@@ -93,14 +102,26 @@ def translate_from_cn_to_en(content: str) -> str:
     """
 
 
+# Maximum number of LLM analysis calls in flight at once
+MAX_CONCURRENT_ANALYSES = 4
+
+# A single character class ('%' already falls in the '$-_' range), so re can use
+# its fast single-character repeat instead of backtracking through alternations
+URL_PATTERN = re.compile(r'https?://[a-zA-Z0-9$-_@.&+!*\\(\\),]+')
+
+
 def extract_urls(text: str) -> List[str]:
-    """Extract URLs from text using regex"""
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    return list(set(re.findall(url_pattern, text)))
+    """Extract unique URLs from text, in order of first appearance"""
+    return list(dict.fromkeys(URL_PATTERN.findall(text)))
 
 async def analyze_email(email_data: Dict[str, Any]) -> Optional[EmailAnalysis]:
     """Analyze single email content"""
     try:
+        # Strip links locally instead of spending LLM tokens on removing them
+        plain_text = email_data.get('plain_text', '')
+        urls = extract_urls(plain_text)
+        cleaned_text = URL_PATTERN.sub('', plain_text)
+
         # Format content for analysis
         content = f"""
         Subject: {email_data.get('headers', {}).get('subject', 'no subject')}
@@ -110,11 +131,12 @@ async def analyze_email(email_data: Dict[str, Any]) -> Optional[EmailAnalysis]:
 
         
         Content:
-        {email_data.get('plain_text', '')}
+        {cleaned_text}
         """
 
-        # Get LLM analysis
-        analysis = get_email_analysis(content)
+        # Get LLM analysis; the promptic call blocks, so run it off the event loop
+        analysis = await asyncio.to_thread(get_email_analysis, content)
+        analysis.link_lists = urls
         print(analysis.model_dump_json())
         return analysis
         
@@ -124,17 +146,61 @@ async def analyze_email(email_data: Dict[str, Any]) -> Optional[EmailAnalysis]:
         print(f"Analysis error: {e}")
         return None
 
+def _scan_numeric_dirs(path: str) -> List[tuple]:
+    """Return (number, DirEntry) for the numerically named subdirectories of path, sorted."""
+    try:
+        with os.scandir(path) as entries:
+            dirs = [
+                (int(entry.name), entry) for entry in entries
+                if entry.name.isdigit() and entry.is_dir()
+            ]
+    except FileNotFoundError:
+        return []
+    return sorted(dirs, key=lambda item: item[0])
+
+def iter_day_dirs(root: str, start_dt: datetime, end_dt: datetime):
+    """
+    Yield (day_dir, day_datetime) for every existing root/YYYY/MM/DD directory
+    whose date falls within [start_dt, end_dt].
+    """
+    start_month = (start_dt.year, start_dt.month)
+    end_month = (end_dt.year, end_dt.month)
+    for year, year_entry in _scan_numeric_dirs(root):
+        if year < start_dt.year or year > end_dt.year:
+            continue
+        for month, month_entry in _scan_numeric_dirs(year_entry.path):
+            if (year, month) < start_month or (year, month) > end_month:
+                continue
+            for day, day_entry in _scan_numeric_dirs(month_entry.path):
+                try:
+                    current_dt = datetime(year, month, day)
+                except ValueError:
+                    continue
+                if start_dt <= current_dt <= end_dt:
+                    yield day_entry.path, current_dt
+
+async def _bounded_analyze(semaphore: asyncio.Semaphore, email_data: Dict[str, Any]):
+    """Analyze an email while holding a slot of the concurrency semaphore."""
+    async with semaphore:
+        return email_data, await analyze_email(email_data)
+
 async def process_directory(input_dir: Path, output_file: Path) -> Dict[str, Dict]:
     """Process all emails in directory"""
 
     if os.path.exists(output_file):
-        with open(output_file, 'r', encoding='utf-8') as f:
-            result_map = json.load(f)
+        # Stream the top-level entries so the whole file is never held as one buffer
+        with open(output_file, 'rb') as f:
+            result_map = dict(ijson.kvitems(f, '', use_float=True))
     else:
         result_map = {}
 
-    for key, value in result_map.items():
-        result_map[key] = EmailAnalysis.model_validate(value).model_dump() if isinstance(value, dict) else value
+    # Results of an interrupted run, one {email_id: analysis} object per line
+    checkpoint_file = Path(output_file).with_suffix('.jsonl')
+    if checkpoint_file.exists():
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    result_map.update(orjson.loads(line))
 
     json_files = list(input_dir.glob("*.json"))
     
@@ -148,8 +214,8 @@ async def process_directory(input_dir: Path, output_file: Path) -> Dict[str, Dic
     for file_path in json_files:
         try:
             print(f"Processing {file_path.name}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                email_datas = json.load(f)
+            with open(file_path, 'rb') as f:
+                email_datas = orjson.loads(f.read())
             # Handle both single email and list of emails
             if not isinstance(email_datas, list):
                 email_datas = [email_datas]
@@ -161,32 +227,94 @@ async def process_directory(input_dir: Path, output_file: Path) -> Dict[str, Dic
             continue
     print(f"Total emails to process: {total_emails}")
 
-    for email_data in tqdm(all_emails):
-        try:
-            email_id = email_data.get('id', '')
-            # Check if email has already been processed
-            if email_id in result_map:
-                email_label = email_data.get('label_name', '')
-                if email_label not in result_map[email_id]['post_labels']:
-                    result_map[email_id]['post_labels'].append(email_label)
+    # Split into emails that still need analysis and repeats that only add a label
+    pending_emails = []
+    pending_ids = set()
+    repeated_emails = []
+    for email_data in all_emails:
+        email_id = email_data.get('id', '')
+        if email_id in result_map or email_id in pending_ids:
+            repeated_emails.append(email_data)
+        else:
+            pending_ids.add(email_id)
+            pending_emails.append(email_data)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+    tasks = [_bounded_analyze(semaphore, email_data) for email_data in pending_emails]
+    with open(checkpoint_file, 'ab') as checkpoint:
+        for next_result in async_tqdm.as_completed(tasks, total=len(tasks)):
+            try:
+                email_data, analysis = await next_result
+                if analysis:
+                    email_id = email_data.get('id', '')
+                    result_map[email_id] = analysis.model_dump()
+                    # Append to the checkpoint instead of rewriting the whole result map
+                    checkpoint.write(orjson.dumps({email_id: result_map[email_id]}) + b'\n')
+                    checkpoint.flush()
+
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Error processing email: {e}")
                 continue
-            if analysis := await analyze_email(email_data):
-                result_map[email_id] = analysis.model_dump()
-            # Save results
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result_map, f, ensure_ascii=False, indent=2)
 
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error processing {file_path.name}: {e}")
+    # Track each email's labels in a set so repeats are O(1) to check; the list keeps the order
+    label_sets = {}
+    for email_data in repeated_emails:
+        email_id = email_data.get('id', '')
+        if email_id not in result_map:
             continue
+        post_labels = result_map[email_id]['post_labels']
+        if email_id not in label_sets:
+            label_sets[email_id] = set(post_labels)
+        email_label = email_data.get('label_name', '')
+        if email_label not in label_sets[email_id]:
+            label_sets[email_id].add(email_label)
+            post_labels.append(email_label)
             
-    # Save results
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result_map, f, ensure_ascii=False, indent=2)
+    # Save results; the checkpoint is folded into the output file now
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(result_map, option=orjson.OPT_INDENT_2))
+    checkpoint_file.unlink(missing_ok=True)
         
     return result_map
 
+def _read_json(path: str) -> Any:
+    """Load a JSON file with orjson."""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Write bytes to a file in one call."""
+    with open(path, 'wb') as f:
+        f.write(data)
+
+async def _analyze_file(
+    semaphore: asyncio.Semaphore,
+    email_id: str,
+    input_file: str,
+    output_file: str,
+    verbose: bool = False
+):
+    """Analyze one dumped email file and save its analysis to output_file."""
+    async with semaphore:
+        try:
+            # Load and analyze email; file I/O runs in a worker thread so other analyses keep going
+            email_data = await asyncio.to_thread(_read_json, input_file)
+
+            if verbose:
+                print(f"Analyzing email: {email_id}")
+
+            if analysis := await analyze_email(email_data):
+                # Save individual analysis
+                await asyncio.to_thread(_write_bytes, output_file, analysis.model_dump_json(indent=2).encode('utf-8'))
+                return email_id, analysis.model_dump()
+
+        except Exception as e:
+            print(f"Error processing {input_file}: {str(e)}")
+            if verbose:
+                traceback.print_exc()
+        return email_id, None
+
 async def process_date_range(
     input_dir: str,
     start_date: str,
@@ -215,84 +343,63 @@ async def process_date_range(
             print(f"Input directory: {input_dir}")
             print(f"Output directory: {output_dir or input_dir}")
 
-        # Initialize result map
+        # Initialize result map and the list of (email_id, input_file, output_file) to analyze
         result_map = {}
+        jobs = []
         
-        # Walk through the directory structure
-        for year in range(start_dt.year, end_dt.year + 1):
-            year_dir = os.path.join(input_dir, str(year))
-            if not os.path.exists(year_dir):
-                continue
-                
-            for month in range(1, 13):
-                if year == start_dt.year and month < start_dt.month:
-                    continue
-                if year == end_dt.year and month > end_dt.month:
-                    continue
-                    
-                month_dir = os.path.join(year_dir, str(month).zfill(2))
-                if not os.path.exists(month_dir):
+        # Walk through the existing day directories within the range
+        for day_dir, current_dt in iter_day_dirs(input_dir, start_dt, end_dt):
+            if verbose:
+                print(f"Processing directory: {day_dir}")
+
+            # List the day directory once; the DirEntry objects carry name, path and type
+            with os.scandir(day_dir) as entries:
+                day_entries = [entry for entry in entries if entry.is_file()]
+
+            # Resolve the output directory once per day and collect its existing analyses
+            if output_dir:
+                out_day_dir = os.path.join(output_dir, str(current_dt.year), f"{current_dt.month:02d}", f"{current_dt.day:02d}")
+                try:
+                    with os.scandir(out_day_dir) as entries:
+                        existing_analyses = {entry.name for entry in entries if entry.name.endswith('_analyzed.json')}
+                except FileNotFoundError:
+                    existing_analyses = set()
+            else:
+                out_day_dir = day_dir
+                existing_analyses = {entry.name for entry in day_entries if entry.name.endswith('_analyzed.json')}
+
+            # Process all JSON files in the day directory; out_day_dir is created with the first job
+            day_has_jobs = False
+            for entry in day_entries:
+                file_name = entry.name
+                if file_name.endswith('_analyzed.json') or not file_name.endswith('.json'):
                     continue
-                    
-                for day in range(1, 32):
-                    try:
-                        current_dt = datetime(year, month, day)
-                    except ValueError as e:
-                        print(f"Invalid date: {year}-{month}-{day}")
-                        continue
-
-                    if current_dt < start_dt or current_dt > end_dt:
-                        continue
-                        
-                    day_dir = os.path.join(month_dir, str(day).zfill(2))
-                    if not os.path.exists(day_dir):
-                        continue
-                        
+                
+                input_file = entry.path
+                email_id = file_name[:-len('.json')]
+                analyzed_name = f"{email_id}_analyzed.json"
+                output_file = os.path.join(out_day_dir, analyzed_name)
+                
+                # Skip if analysis exists and not overwriting
+                if analyzed_name in existing_analyses and not overwrite:
                     if verbose:
-                        print(f"Processing directory: {day_dir}")
-                        
-                    # Process all JSON files in the day directory
-                    for file_name in os.listdir(day_dir):
-                        if not file_name.endswith('.json') or file_name.endswith('_analyzed.json'):
-                            continue
-                            
-                        input_file = os.path.join(day_dir, file_name)
-                        email_id = os.path.splitext(file_name)[0]
-                        
-                        # Determine output path
-                        if output_dir:
-                            out_day_dir = os.path.join(output_dir, str(year), str(month).zfill(2), str(day).zfill(2))
-                            os.makedirs(out_day_dir, exist_ok=True)
-                            output_file = os.path.join(out_day_dir, f"{email_id}_analyzed.json")
-                        else:
-                            output_file = os.path.join(day_dir, f"{email_id}_analyzed.json")
-                            
-                        # Skip if analysis exists and not overwriting
-                        if os.path.exists(output_file) and not overwrite:
-                            if verbose:
-                                print(f"Skipping existing analysis: {output_file}")
-                            continue
-                            
-                        try:
-                            # Load and analyze email
-                            with open(input_file, 'r', encoding='utf-8') as f:
-                                email_data = json.load(f)
-                                
-                            if verbose:
-                                print(f"Analyzing email: {email_id}")
-                                
-                            if analysis := await analyze_email(email_data):
-                                result_map[email_id] = analysis.model_dump()
-                                
-                                # Save individual analysis
-                                with open(output_file, 'w', encoding='utf-8') as f:
-                                    json.dump(analysis.model_dump(), f, ensure_ascii=False, indent=2)
-                                    
-                        except Exception as e:
-                            print(f"Error processing {input_file}: {str(e)}")
-                            if verbose:
-                                traceback.print_exc()
-                            continue
+                        print(f"Skipping existing analysis: {output_file}")
+                    continue
+                
+                if not day_has_jobs:
+                    os.makedirs(out_day_dir, exist_ok=True)
+                    day_has_jobs = True
+                jobs.append((email_id, input_file, output_file))
+
+        # Analyze the collected emails concurrently
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+        tasks = [
+            _analyze_file(semaphore, email_id, input_file, output_file, verbose)
+            for email_id, input_file, output_file in jobs
+        ]
+        for email_id, analysis in await asyncio.gather(*tasks):
+            if analysis:
+                result_map[email_id] = analysis
         
         if verbose:
             print(f"Successfully analyzed {len(result_map)} emails")
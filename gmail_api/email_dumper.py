@@ -1,13 +1,14 @@
-import json
+import orjson
 import os
 import datetime
-from typing import List, Dict, Any
-import base64
+import traceback
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from email import message_from_bytes
 from email.message import EmailMessage
 import email
 from .label_service import LabelService
-from .message_service import MessageService
+from .message_service import MessageService, _b64url_decode
 
 class EmailDumper:
     def __init__(self, service):
@@ -17,22 +18,21 @@ class EmailDumper:
         self.service = service
 
     def _parse_message_parts(self, parts, content: Dict[str, Any]):
-        """Recursively parse message parts to extract content."""
-        for part in parts:
+        """Walk the MIME part tree depth-first, in document order, to extract content."""
+        # Explicit stack instead of recursion; children are pushed reversed to keep document order
+        stack = list(reversed(parts))
+        while stack:
+            part = stack.pop()
             mime_type = part.get('mimeType', '')
             if mime_type.startswith('text/'):
                 data = part.get('body', {}).get('data', '')
                 if data:
-                    text = base64.urlsafe_b64decode(data).decode()
+                    text = _b64url_decode(data).decode('utf-8', 'replace')
                     if mime_type == 'text/plain':
                         content['plain_text'] = text
                     elif mime_type == 'text/html':
                         content['html'] = text
             
-            # Handle nested parts
-            if 'parts' in part:
-                self._parse_message_parts(part['parts'], content)
-            
             # Handle attachments
             if 'filename' in part and part['filename']:
                 attachment = {
@@ -42,6 +42,46 @@ class EmailDumper:
                 }
                 content.setdefault('attachments', []).append(attachment)
 
+            # Handle nested parts
+            if 'parts' in part:
+                stack.extend(reversed(part['parts']))
+
+    def _message_to_content(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a full-format Gmail message resource into our content dictionary."""
+        # Extract headers
+        headers = {}
+        for header in message['payload']['headers']:
+            name = header['name'].lower()
+            headers[name] = header['value']
+
+        # Initialize content dictionary
+        content = {
+            'id': message['id'],
+            'thread_id': message['threadId'],
+            'label_ids': message.get('labelIds', []),
+            'snippet': message.get('snippet', ''),
+            'internal_date': message.get('internalDate'),
+            'headers': headers,
+            'plain_text': '',
+            'html': '',
+            'attachments': []
+        }
+
+        # Parse message parts
+        if 'parts' in message['payload']:
+            self._parse_message_parts(message['payload']['parts'], content)
+        else:
+            # Handle messages with no parts
+            data = message['payload']['body'].get('data', '')
+            if data:
+                text = _b64url_decode(data).decode('utf-8', 'replace')
+                if message['payload']['mimeType'] == 'text/plain':
+                    content['plain_text'] = text
+                elif message['payload']['mimeType'] == 'text/html':
+                    content['html'] = text
+
+        return content
+
     def get_detailed_message(self, message_id: str) -> Dict[str, Any]:
         """Get detailed message content including all parts and metadata."""
         try:
@@ -50,44 +90,30 @@ class EmailDumper:
                 id=message_id,
                 format='full'
             ).execute()
-
-            # Extract headers
-            headers = {}
-            for header in message['payload']['headers']:
-                name = header['name'].lower()
-                headers[name] = header['value']
-
-            # Initialize content dictionary
-            content = {
-                'id': message['id'],
-                'thread_id': message['threadId'],
-                'label_ids': message.get('labelIds', []),
-                'snippet': message.get('snippet', ''),
-                'internal_date': message.get('internalDate'),
-                'headers': headers,
-                'plain_text': '',
-                'html': '',
-                'attachments': []
-            }
-
-            # Parse message parts
-            if 'parts' in message['payload']:
-                self._parse_message_parts(message['payload']['parts'], content)
-            else:
-                # Handle messages with no parts
-                data = message['payload']['body'].get('data', '')
-                if data:
-                    text = base64.urlsafe_b64decode(data).decode()
-                    if message['payload']['mimeType'] == 'text/plain':
-                        content['plain_text'] = text
-                    elif message['payload']['mimeType'] == 'text/html':
-                        content['html'] = text
-
-            return content
+            return self._message_to_content(message)
 
         except Exception as e:
             return None
 
+    def iter_detailed_messages(self, message_ids: Iterable[str]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Fetch detailed messages through Gmail batch HTTP requests.
+
+        Args:
+            message_ids: IDs of the messages to fetch
+
+        Yields:
+            (message_id, content) in input order; content is None if the fetch failed
+        """
+        for message_id, message in self.message_service.batch_get_messages(message_ids, {'format': 'full'}):
+            content = None
+            if message:
+                try:
+                    content = self._message_to_content(message)
+                except Exception as e:
+                    print(f"Error parsing message {message_id}: {str(e)}")
+            yield message_id, content
+
     def dump_emails_by_labels(self, label_names: List[str], output_dir: str):
         """
         Dump emails for each specified label to separate JSON files.
@@ -108,11 +134,11 @@ class EmailDumper:
                 label_id = label['id']
                 query = f'label:{label_name}'
 
-                messages = self.message_service.list_messages(query=query)
                 emails = []
 
-                for message in messages:
-                    email_data = self.get_detailed_message(message['id'])
+                # Stream IDs from the list pages into the batch fetches instead of listing them all first
+                message_ids = (message['id'] for message in self.message_service.iter_messages(query=query))
+                for _, email_data in self.iter_detailed_messages(message_ids):
                     if email_data:
                         email_data['label_name'] = label_name
                         email_data['label_id'] = label_id
@@ -122,8 +148,8 @@ class EmailDumper:
                     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                     filename = f"{label_name.replace('/', '_')}_{timestamp}.json"
                     file_path = output_path / filename
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(emails, f, ensure_ascii=False, indent=2)
+                    with open(file_path, 'wb') as f:
+                        f.write(orjson.dumps(emails, option=orjson.OPT_INDENT_2))
                 else:
                     pass
 
@@ -152,14 +178,16 @@ class EmailDumper:
             if verbose:
                 print(f"Fetching emails with query: {query}")
 
-            messages = self.message_service.list_messages(query=query)
             created_files = []
+            # Day directories already created during this dump
+            created_dirs = set()
 
-            for message in messages:
-                email_data = self.get_detailed_message(message['id'])
+            # Stream IDs from the list pages into the batch fetches instead of listing them all first
+            message_ids = (message['id'] for message in self.message_service.iter_messages(query=query))
+            for message_id, email_data in self.iter_detailed_messages(message_ids):
                 if not email_data:
                     if verbose:
-                        print(f"Failed to fetch email {message['id']}")
+                        print(f"Failed to fetch email {message_id}")
                     continue
 
                 # Extract date from internalDate (Unix timestamp in milliseconds)
@@ -173,7 +201,9 @@ class EmailDumper:
                     str(email_date.month).zfill(2),
                     str(email_date.day).zfill(2)
                 )
-                os.makedirs(date_dir, exist_ok=True)
+                if date_dir not in created_dirs:
+                    os.makedirs(date_dir, exist_ok=True)
+                    created_dirs.add(date_dir)
 
                 # Save email to JSON file
                 file_path = os.path.join(date_dir, f"{email_data['id']}.json")
@@ -186,8 +216,8 @@ class EmailDumper:
                 if verbose:
                     print(f"Saving email to: {file_path}")
 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(email_data, f, ensure_ascii=False, indent=2)
+                with open(file_path, 'wb') as f:
+                    f.write(orjson.dumps(email_data, option=orjson.OPT_INDENT_2))
                 created_files.append(file_path)
 
             return created_files
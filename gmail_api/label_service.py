@@ -1,10 +1,23 @@
-from typing import List, Dict, Any, Optional
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from .auth import NUM_RETRIES
+from .async_service import AsyncGmailMixin
 
-class LabelService:
+logger = logging.getLogger(__name__)
+
+class LabelService(AsyncGmailMixin):
     def __init__(self, service):
         """Initialize Label service with Gmail API service."""
         self.service = service
+        # (labels by lowercase full name, labels by lowercase last path segment), built by _get_label_maps
+        self._label_cache = None
+        self._label_cache_ts = 0.0
+        # Last labels().list result and its ETag, for conditional re-fetches in list_labels
+        self._labels = []
+        self._labels_etag = None
 
     def list_labels(self) -> List[Dict[str, Any]]:
         """
@@ -14,12 +27,54 @@ class LabelService:
             List of label objects containing id, name, and other metadata
         """
         try:
-            results = self.service.users().labels().list(userId='me').execute()
-            return results.get('labels', [])
+            request = self.service.users().labels().list(userId='me', fields='labels(id,name,type)')
+            if self._labels_etag:
+                # Labels rarely change; an unchanged list comes back as an empty 304
+                request.headers['If-None-Match'] = self._labels_etag
+            etags = []
+            request.add_response_callback(lambda resp: etags.append(resp.get('etag')))
+            results = request.execute(num_retries=NUM_RETRIES)
+            self._labels = results.get('labels', [])
+            self._labels_etag = etags[-1] if etags else None
+            return self._labels
+        except HttpError as e:
+            if e.resp.status == 304:
+                return self._labels
+            logger.warning("Error listing labels: %s", e, exc_info=True)
+            return []
         except Exception as e:
-            print(f"Error listing labels: {str(e)}")
+            logger.warning("Error listing labels: %s", e, exc_info=True)
             return []
 
+    def _get_label_maps(self, ttl: float = 60) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Return lookup dictionaries over the label list, refreshing them after ttl seconds.
+        
+        Args:
+            ttl: Seconds a fetched label list stays valid
+            
+        Returns:
+            Labels keyed by lowercase full name, and by lowercase last path segment
+        """
+        if self._label_cache is None or time.monotonic() - self._label_cache_ts > ttl:
+            labels = self.list_labels()
+            by_name = {}
+            by_leaf = {}
+            # setdefault keeps the first match, as the original linear scans did
+            for label in labels:
+                by_name.setdefault(label['name'].lower(), label)
+                by_leaf.setdefault(label['name'].split('/')[-1].lower(), label)
+            if not labels:
+                # An empty list means the request failed; don't keep it around
+                return by_name, by_leaf
+            self._label_cache = (by_name, by_leaf)
+            self._label_cache_ts = time.monotonic()
+        return self._label_cache
+
+    def _invalidate_label_cache(self):
+        """Drop the cached label list after labels are changed."""
+        self._label_cache = None
+
     def get_label_by_name(self, label_name: str) -> Optional[Dict[str, Any]]:
         """
         Find a label by its name.
@@ -31,24 +86,16 @@ class LabelService:
             Label object if found, None otherwise
         """
         try:
-            labels = self.list_labels()
+            by_name, by_leaf = self._get_label_maps()
             # Try exact match first
-            for label in labels:
-                if label['name'].lower() == label_name.lower():
-                    return label
+            label = by_name.get(label_name.lower())
+            if label is not None:
+                return label
             
             # Try partial match (ignoring parent labels)
-            label_parts = label_name.split('/')
-            search_name = label_parts[-1].lower()
-            
-            for label in labels:
-                label_name_parts = label['name'].split('/')
-                if label_name_parts[-1].lower() == search_name:
-                    return label
-            
-            return None
+            return by_leaf.get(label_name.split('/')[-1].lower())
         except Exception as e:
-            print(f"Error getting label by name: {str(e)}")
+            logger.warning("Error getting label by name: %s", e, exc_info=True)
             return None
 
     def delete_label(self, label_id: str) -> bool:
@@ -62,10 +109,11 @@ class LabelService:
             True if successful, False otherwise
         """
         try:
-            self.service.users().labels().delete(userId='me', id=label_id).execute()
+            self.service.users().labels().delete(userId='me', id=label_id).execute(num_retries=NUM_RETRIES)
+            self._invalidate_label_cache()
             return True
         except Exception as e:
-            print(f"Error deleting label: {str(e)}")
+            logger.warning("Error deleting label: %s", e, exc_info=True)
             return False
 
     def update_label(self, label_id: str, new_name: str, 
@@ -94,11 +142,12 @@ class LabelService:
                 userId='me',
                 id=label_id,
                 body=label_object
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
+            self._invalidate_label_cache()
             
             return updated_label
         except Exception as e:
-            print(f"Error updating label: {str(e)}")
+            logger.warning("Error updating label: %s", e, exc_info=True)
             return None
 
     def create_label(self, label_name: str) -> Optional[str]:
@@ -121,10 +170,11 @@ class LabelService:
             created_label = self.service.users().labels().create(
                 userId='me',
                 body=label_object
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
+            self._invalidate_label_cache()
             
             return created_label['id']
         
         except Exception as e:
-            print(f"Error creating label: {str(e)}")
+            logger.warning("Error creating label: %s", e, exc_info=True)
             return None
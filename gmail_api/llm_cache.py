@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+import functools
+import threading
+import traceback
+from typing import Any, Callable
+
+# Directory holding one JSON file per cached LLM response
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+
+
+def _cache_path(key: str) -> str:
+    """Spread cache files over 256 subdirectories to keep directory listings small."""
+    return os.path.join(LLM_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def llm_cache(*key_parts: str,
+              encode: Callable[[Any], str] = json.dumps,
+              decode: Callable[[str], Any] = json.loads):
+    """
+    Cache the results of a single-argument LLM function on disk.
+
+    The cache key is a SHA-256 over the function name, its prompt template,
+    the given key parts (model, system prompt, ...) and the content argument,
+    so changing any of them yields a fresh call.
+
+    Args:
+        key_parts: Strings identifying the prompt setup, e.g. model and system prompt
+        encode: Converts a result into a string for storage
+        decode: Converts a stored string back into a result
+    """
+    def decorator(func):
+        prefix = "\x00".join((func.__name__, func.__doc__ or "", *key_parts))
+
+        @functools.wraps(func)
+        def wrapper(content: str):
+            key = hashlib.sha256(f"{prefix}\x00{content}".encode("utf-8")).hexdigest()
+            path = _cache_path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return decode(f.read())
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error reading LLM cache {path}: {e}")
+
+            result = func(content)
+            if result is None:
+                return result
+
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write under a unique temp name and rename, so concurrent callers never read a partial file
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(encode(result))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Error writing LLM cache {path}: {e}")
+                print(traceback.format_exc())
+            return result
+
+        return wrapper
+    return decorator
@@ -1,20 +1,164 @@
-from typing import List, Dict, Any, Optional
+import logging
+import random
+import time
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import base64
+from binascii import a2b_base64
+from email import message_from_bytes, policy
+from email.message import EmailMessage
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from googleapiclient.errors import HttpError
+from .auth import NUM_RETRIES
+from .async_service import AsyncGmailMixin
 
-class MessageService:
+logger = logging.getLogger(__name__)
+
+# Messages fetched per Gmail batch HTTP request (the API allows 100, Google recommends at most 50)
+BATCH_SIZE = 50
+
+# Headers requested when get_emails is called with fetch_body=False
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+
+# Partial-response masks limiting Gmail API replies to the fields this service reads
+LIST_FIELDS = 'messages(id,threadId),nextPageToken'
+GET_FIELDS = 'id,threadId,labelIds,payload(mimeType,headers,body/data,parts)'
+RAW_FIELDS = 'id,threadId,labelIds,raw'
+
+# Message IDs accepted by a single messages.batchModify call
+BATCH_MODIFY_SIZE = 1000
+
+
+# Maps the URL-safe base64 alphabet Gmail uses back to the standard one
+_URLSAFE_TO_STD = bytes.maketrans(b'-_', b'+/')
+
+
+def _b64url_decode(data: str) -> bytes:
+    """Decode Gmail's URL-safe base64 part data, tolerating stripped padding."""
+    raw = data.encode('ascii').translate(_URLSAFE_TO_STD)
+    return a2b_base64(raw + b'=' * (-len(raw) % 4))
+
+
+def _extract_text(part: Dict[str, Any], buf: bytearray):
+    """Append the decoded data of every text/plain part under part, in document order, to buf."""
+    if part.get('mimeType') == 'text/plain':
+        data = part.get('body', {}).get('data', '')
+        if data:
+            buf.extend(_b64url_decode(data))
+    for child in part.get('parts', []):
+        _extract_text(child, buf)
+
+
+def _part_text(part: EmailMessage) -> str:
+    """Decode a parsed MIME leaf, falling back to UTF-8 when its charset is unknown or wrong."""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError):
+        return (part.get_payload(decode=True) or b'').decode('utf-8', 'replace')
+
+
+def _is_transient(status: int) -> bool:
+    """Whether an HTTP status is worth retrying: rate limiting or a server error."""
+    return status == 429 or status >= 500
+
+
+class MessageService(AsyncGmailMixin):
     def __init__(self, service):
         """Initialize Message service with Gmail API service."""
         self.service = service
 
-    def get_emails(self, query: str = '', max_results: int = 10) -> List[Dict[str, Any]]:
+    def batch_get_messages(self, message_ids: Iterable[str],
+                           get_kwargs: Dict[str, Any]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Fetch messages through Gmail batch HTTP requests, BATCH_SIZE per request.
+
+        message_ids is consumed lazily, so it can be e.g. a generator over iter_messages;
+        each batch is sent as soon as BATCH_SIZE new IDs have been read.
+
+        Args:
+            message_ids: IDs of the messages to fetch; duplicates are fetched once
+            get_kwargs: Extra arguments for each messages.get call, e.g. format and fields
+
+        Yields:
+            (message_id, resource) in input order; resource is None if the fetch failed
+        """
+        seen = set()
+        # set.add returns None, so this keeps the first occurrence of each ID
+        unique_ids = (message_id for message_id in message_ids
+                      if message_id not in seen and not seen.add(message_id))
+        while chunk := list(islice(unique_ids, BATCH_SIZE)):
+            responses = self._execute_batch_with_retry(chunk, get_kwargs)
+            for message_id in chunk:
+                yield message_id, responses.get(message_id)
+
+    def _execute_batch_with_retry(self, message_ids: List[str],
+                                  get_kwargs: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Run one batch of messages.get calls, re-batching only the transient failures.
+
+        execute(num_retries=...) does not retry the parts of a batch, so messages answered
+        with 429 or 5xx are sent again, up to NUM_RETRIES times, with exponential backoff
+        and jitter. Other errors are logged and the message is left out of the result.
+        """
+        responses = {}
+        pending = message_ids
+        for attempt in range(NUM_RETRIES + 1):
+            retry = []
+
+            def on_response(request_id, response, exception):
+                if exception is None:
+                    responses[request_id] = response
+                elif (isinstance(exception, HttpError) and _is_transient(exception.resp.status)
+                      and attempt < NUM_RETRIES):
+                    retry.append(request_id)
+                else:
+                    logger.warning("Error fetching message %s: %s", request_id, exception)
+
+            try:
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for message_id in pending:
+                    batch.add(
+                        self.service.users().messages().get(userId='me', id=message_id, **get_kwargs),
+                        request_id=message_id
+                    )
+                batch.execute()
+            except Exception as e:
+                logger.warning("Error executing batch request: %s", e)
+
+            if not retry:
+                break
+            pending = retry
+            time.sleep(2 ** attempt + random.random())
+        return responses
+
+    def _raw_to_email_data(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse a format='raw' message locally into the get_emails dictionary."""
+        parsed = message_from_bytes(_b64url_decode(msg['raw']), policy=policy.default)
+        # Join the inline text/plain leaves in document order, as _extract_text does in full mode;
+        # there Gmail sends attachments as an attachmentId without data, so they are skipped here too
+        body = ''.join(_part_text(part) for part in parsed.walk()
+                       if part.get_content_type() == 'text/plain' and not part.is_attachment())
+        return {
+            'id': msg['id'],
+            'threadId': msg['threadId'],
+            'labelIds': msg.get('labelIds', []),
+            'subject': str(parsed.get('Subject', '')),
+            'from': str(parsed.get('From', '')),
+            'date': str(parsed.get('Date', '')),
+            'body': body
+        }
+
+    def get_emails(self, query: str = '', max_results: int = 10,
+                   fetch_body: bool = True, format_mode: str = 'full') -> List[Dict[str, Any]]:
         """
         Retrieve emails from Gmail based on query.
         
         Args:
             query: Search query string
             max_results: Maximum number of emails to retrieve
+            fetch_body: Download and decode message bodies; if False, 'body' is left empty
+            format_mode: 'full' to let Gmail parse the MIME tree, or 'raw' to download the
+                source and parse it locally (smaller responses when fetching many bodies)
             
         Returns:
             List of email messages with their content
@@ -24,66 +168,61 @@ class MessageService:
             results = self.service.users().messages().list(
                 userId='me',
                 q=query,
-                maxResults=max_results
-            ).execute()
+                maxResults=max_results,
+                fields=LIST_FIELDS
+            ).execute(num_retries=NUM_RETRIES)
 
             messages = results.get('messages', [])
             emails = []
 
-            for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me',
-                    id=message['id'],
-                    format='full'
-                ).execute()
-                
+            if fetch_body and format_mode == 'raw':
+                get_kwargs = {'format': 'raw', 'fields': RAW_FIELDS}
+            elif fetch_body:
+                get_kwargs = {'format': 'full', 'fields': GET_FIELDS}
+            else:
+                get_kwargs = {'format': 'metadata', 'metadataHeaders': METADATA_HEADERS, 'fields': GET_FIELDS}
+
+            message_ids = [message['id'] for message in messages]
+            for _, msg in self.batch_get_messages(message_ids, get_kwargs):
+                if msg is None:
+                    continue
+                if 'raw' in msg:
+                    try:
+                        emails.append(self._raw_to_email_data(msg))
+                    except Exception as e:
+                        logger.warning("Error parsing message %s: %s", msg.get('id'), e)
+                    continue
+
                 # Parse email content
                 payload = msg['payload']
                 headers = payload.get('headers', [])
                 
+                # Index headers by lowercase name in one pass
+                header_map = {header['name'].lower(): header['value'] for header in headers}
+
                 # Extract email metadata
                 email_data = {
                     'id': msg['id'],
                     'threadId': msg['threadId'],
                     'labelIds': msg.get('labelIds', []),
-                    'subject': '',
-                    'from': '',
-                    'date': '',
+                    'subject': header_map.get('subject', ''),
+                    'from': header_map.get('from', ''),
+                    'date': header_map.get('date', ''),
                     'body': ''
                 }
 
-                # Get headers
-                for header in headers:
-                    name = header['name'].lower()
-                    if name == 'subject':
-                        email_data['subject'] = header['value']
-                    elif name == 'from':
-                        email_data['from'] = header['value']
-                    elif name == 'date':
-                        email_data['date'] = header['value']
-
-                # Get email body
-                if 'parts' in payload:
-                    parts = payload['parts']
-                    for part in parts:
-                        if part['mimeType'] == 'text/plain':
-                            data = part['body'].get('data', '')
-                            if data:
-                                text = base64.urlsafe_b64decode(data).decode()
-                                email_data['body'] += text
-                else:
-                    # Handle messages with no parts
-                    data = payload['body'].get('data', '')
-                    if data:
-                        text = base64.urlsafe_b64decode(data).decode()
-                        email_data['body'] += text
+                # Get email body, collecting raw bytes and decoding once at the end
+                if fetch_body:
+                    body = bytearray()
+                    _extract_text(payload, body)
+                    email_data['body'] = body.decode('utf-8', errors='replace')
 
                 emails.append(email_data)
 
             return emails
 
         except Exception as e:
-            print(f"Error retrieving emails: {str(e)}")
+            logger.warning("Error retrieving emails: %s", e, exc_info=True)
             return []
 
     def send_email(self, to: str, subject: str, body: str, 
@@ -102,7 +241,8 @@ class MessageService:
             True if successful, False otherwise
         """
         try:
-            message = MIMEMultipart()
+            # Text-only mail needs no multipart wrapper around the single body part
+            message = MIMEText(body)
             message['to'] = to
             message['subject'] = subject
             
@@ -111,9 +251,6 @@ class MessageService:
             if bcc:
                 message['bcc'] = bcc
 
-            msg = MIMEText(body)
-            message.attach(msg)
-
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
             
             self.service.users().messages().send(
@@ -123,15 +260,18 @@ class MessageService:
             
             return True
         except Exception as e:
-            print(f"Error sending email: {str(e)}")
+            logger.warning("Error sending email: %s", e, exc_info=True)
             return False
 
-    def mark_as_read(self, message_id: str) -> bool:
+    def modify_labels(self, message_id: str, add_label_ids: Optional[List[str]] = None,
+                      remove_label_ids: Optional[List[str]] = None) -> bool:
         """
-        Mark an email as read by removing the UNREAD label.
+        Add and remove labels on a message in a single modify request.
         
         Args:
-            message_id: ID of the message to mark as read
+            message_id: ID of the message to modify
+            add_label_ids: List of label IDs to add
+            remove_label_ids: List of label IDs to remove
             
         Returns:
             True if successful, False otherwise
@@ -140,34 +280,65 @@ class MessageService:
             self.service.users().messages().modify(
                 userId='me',
                 id=message_id,
-                body={'removeLabelIds': ['UNREAD']}
-            ).execute()
+                body={'addLabelIds': add_label_ids or [], 'removeLabelIds': remove_label_ids or []}
+            ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error marking message as read: {str(e)}")
+            logger.warning("Error modifying labels: %s", e, exc_info=True)
             return False
 
-    def mark_as_unread(self, message_id: str) -> bool:
+    def bulk_modify_labels(self, message_ids: List[str], add_label_ids: Optional[List[str]] = None,
+                           remove_label_ids: Optional[List[str]] = None) -> bool:
         """
-        Mark an email as unread by adding the UNREAD label.
+        Add and remove labels on many messages using batchModify.
         
         Args:
-            message_id: ID of the message to mark as unread
+            message_ids: IDs of the messages to modify
+            add_label_ids: List of label IDs to add
+            remove_label_ids: List of label IDs to remove
             
         Returns:
             True if successful, False otherwise
         """
         try:
-            self.service.users().messages().modify(
-                userId='me',
-                id=message_id,
-                body={'addLabelIds': ['UNREAD']}
-            ).execute()
+            for start in range(0, len(message_ids), BATCH_MODIFY_SIZE):
+                self.service.users().messages().batchModify(
+                    userId='me',
+                    body={
+                        'ids': message_ids[start:start + BATCH_MODIFY_SIZE],
+                        'addLabelIds': add_label_ids or [],
+                        'removeLabelIds': remove_label_ids or []
+                    }
+                ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error marking message as unread: {str(e)}")
+            logger.warning("Error bulk modifying labels: %s", e, exc_info=True)
             return False
 
+    def mark_as_read(self, message_id: str) -> bool:
+        """
+        Mark an email as read by removing the UNREAD label.
+        
+        Args:
+            message_id: ID of the message to mark as read
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self.modify_labels(message_id, remove_label_ids=['UNREAD'])
+
+    def mark_as_unread(self, message_id: str) -> bool:
+        """
+        Mark an email as unread by adding the UNREAD label.
+        
+        Args:
+            message_id: ID of the message to mark as unread
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self.modify_labels(message_id, add_label_ids=['UNREAD'])
+
     def trash_message(self, message_id: str) -> bool:
         """
         Move a message to trash.
@@ -182,10 +353,10 @@ class MessageService:
             self.service.users().messages().trash(
                 userId='me',
                 id=message_id
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error moving message to trash: {str(e)}")
+            logger.warning("Error moving message to trash: %s", e, exc_info=True)
             return False
 
     def untrash_message(self, message_id: str) -> bool:
@@ -202,10 +373,10 @@ class MessageService:
             self.service.users().messages().untrash(
                 userId='me',
                 id=message_id
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error restoring message from trash: {str(e)}")
+            logger.warning("Error restoring message from trash: %s", e, exc_info=True)
             return False
 
     def add_labels_to_message(self, message_id: str, label_ids: List[str]) -> bool:
@@ -219,16 +390,7 @@ class MessageService:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            self.service.users().messages().modify(
-                userId='me',
-                id=message_id,
-                body={'addLabelIds': label_ids}
-            ).execute()
-            return True
-        except Exception as e:
-            print(f"Error adding labels: {str(e)}")
-            return False
+        return self.modify_labels(message_id, add_label_ids=label_ids)
 
     def remove_labels_from_message(self, message_id: str, label_ids: List[str]) -> bool:
         """
@@ -241,16 +403,46 @@ class MessageService:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            self.service.users().messages().modify(
+        return self.modify_labels(message_id, remove_label_ids=label_ids)
+
+    def iter_messages(self, query: str = None, max_results: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield messages matching the specified query one at a time, fetching result pages as needed.
+        
+        Unlike list_messages, API errors are raised to the caller.
+        
+        Args:
+            query: Search query (Gmail search syntax)
+            max_results: Maximum number of messages to yield (None for all)
+            
+        Yields:
+            Message objects containing id and threadId
+        """
+        count = 0
+        page_token = None
+        
+        while True:
+            # Only ask for as many messages as are still needed (the API caps a page at 100)
+            page_size = min(max(max_results - count, 1), 100) if max_results else 100
+            response = self.service.users().messages().list(
                 userId='me',
-                id=message_id,
-                body={'removeLabelIds': label_ids}
-            ).execute()
-            return True
-        except Exception as e:
-            print(f"Error removing labels: {str(e)}")
-            return False
+                q=query if query else '',
+                pageToken=page_token,
+                maxResults=page_size,
+                fields=LIST_FIELDS
+            ).execute(num_retries=NUM_RETRIES)
+            batch = response.get('messages', [])
+            if max_results:
+                batch = batch[:max_results - count]
+            yield from batch
+            count += len(batch)
+            
+            if max_results and count >= max_results:
+                break
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
     def list_messages(self, query: str = None, max_results: int = None) -> List[Dict[str, Any]]:
         """
@@ -264,35 +456,10 @@ class MessageService:
             List of message objects containing id and threadId
         """
         try:
-            messages = []
-            page_token = None
-            
-            while True:
-                request = self.service.users().messages().list(
-                    userId='me',
-                    q=query if query else '',
-                    pageToken=page_token,
-                    maxResults=min(max_results, 100) if max_results else 100
-                )
-                response = request.execute()
-                batch = response.get('messages', [])
-                
-                if not batch:
-                    break
-                    
-                messages.extend(batch)
-                
-                if max_results and len(messages) >= max_results:
-                    messages = messages[:max_results]
-                    break
-                
-                page_token = response.get('nextPageToken')
-                if not page_token:
-                    break
-                    
+            messages = list(self.iter_messages(query, max_results))
             print(f"Found {len(messages)} messages matching query: {query}")
             return messages
             
         except Exception as e:
-            print(f"Error listing messages: {str(e)}")
+            logger.warning("Error listing messages: %s", e, exc_info=True)
             return []
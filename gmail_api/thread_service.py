@@ -1,6 +1,11 @@
+import logging
 from typing import List, Dict, Any, Optional
+from .auth import NUM_RETRIES
+from .async_service import AsyncGmailMixin
 
-class ThreadService:
+logger = logging.getLogger(__name__)
+
+class ThreadService(AsyncGmailMixin):
     def __init__(self, service):
         """Initialize Thread service with Gmail API service."""
         self.service = service
@@ -19,10 +24,10 @@ class ThreadService:
             thread = self.service.users().threads().get(
                 userId='me',
                 id=thread_id
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
             return thread
         except Exception as e:
-            print(f"Error retrieving thread: {str(e)}")
+            logger.warning("Error retrieving thread: %s", e, exc_info=True)
             return None
 
     def list_threads(self, query: str = '', max_results: int = 10) -> List[Dict[str, Any]]:
@@ -40,11 +45,12 @@ class ThreadService:
             threads = self.service.users().threads().list(
                 userId='me',
                 q=query,
-                maxResults=max_results
-            ).execute()
+                maxResults=max_results,
+                fields='threads(id,snippet,historyId),nextPageToken'
+            ).execute(num_retries=NUM_RETRIES)
             return threads.get('threads', [])
         except Exception as e:
-            print(f"Error listing threads: {str(e)}")
+            logger.warning("Error listing threads: %s", e, exc_info=True)
             return []
 
     def modify_thread(self, thread_id: str, add_labels: List[str] = None, 
@@ -72,10 +78,10 @@ class ThreadService:
                     userId='me',
                     id=thread_id,
                     body=body
-                ).execute()
+                ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error modifying thread: {str(e)}")
+            logger.warning("Error modifying thread: %s", e, exc_info=True)
             return False
 
     def trash_thread(self, thread_id: str) -> bool:
@@ -92,10 +98,10 @@ class ThreadService:
             self.service.users().threads().trash(
                 userId='me',
                 id=thread_id
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error moving thread to trash: {str(e)}")
+            logger.warning("Error moving thread to trash: %s", e, exc_info=True)
             return False
 
     def untrash_thread(self, thread_id: str) -> bool:
@@ -112,8 +118,8 @@ class ThreadService:
             self.service.users().threads().untrash(
                 userId='me',
                 id=thread_id
-            ).execute()
+            ).execute(num_retries=NUM_RETRIES)
             return True
         except Exception as e:
-            print(f"Error restoring thread from trash: {str(e)}")
+            logger.warning("Error restoring thread from trash: %s", e, exc_info=True)
             return False
@@ -1,71 +1,105 @@
 import re
 import os
-import json
+import mmap
+import orjson
 import typer
 import asyncio
+import datetime
 import traceback
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from gmail_api.email_analyzer import process_directory, process_date_range
-from gmail_api.auth import get_gmail_service
-from gmail_api.email_dumper import EmailDumper
-from googleapiclient.discovery import build
-import datetime
-
-# Import the PDF parser
-from tools.pdf.pdf_parser import parse_pdf
+# Gmail, LLM and PDF modules are imported inside their commands to keep CLI startup fast
 
 app = typer.Typer(pretty_exceptions_show_locals=False)
 
+# Email headers left out of data/raw_emails.json by trim_data_according_to_openai
+TRIMMED_HEADERS = frozenset({'message-id', 'from', 'to', 'content-type'})
+
+
+def _load_json(path):
+    """Parse a JSON file with orjson straight from a read-only memory map of it."""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped; let orjson report them as invalid JSON
+            return orjson.loads(f.read())
+    with mm:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mm) as view:
+            return orjson.loads(view)
+
+
+def _dump_json(path, obj, pretty: bool = True):
+    """Serialize obj to a UTF-8 JSON file with orjson, indented unless pretty is False."""
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(obj, option=option))
+
+
+def _iter_json_files(directory):
+    """Yield paths of the .json files directly inside directory as the listing is read."""
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith('.json') and entry.is_file():
+                    yield entry.path
+    except FileNotFoundError:
+        return
+
+
 @app.command()
-def trim_data_according_to_openai():
+def trim_data_according_to_openai(
+    pretty: bool = typer.Option(True, "--pretty/--compact", help="Indent the output JSON files for reading, or write them compact")
+):
     email_map = {}
     input_dir = Path("email_dumps")
-    json_files = list(input_dir.glob("*.json"))
-    if not json_files:
-        print("No JSON files found")
-        return None
 
-    # calculate how many email_data in different json files will be processed
-    total_emails = 0
-    all_emails = []
-    for file_path in json_files:
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        analyzed_futures = {
+            name: pool.submit(_load_json, f'./analyzed_emails_{name}.json')
+            for name in ('qwen', 'openai', 'deepseek', 'llama')
+        }
+        analyzed = {}
+        for name, future in analyzed_futures.items():
+            analyzed[name] = future.result()
+            print(f"Total emails to process: {len(analyzed[name])}")
+
+    qwen_data = analyzed['qwen']
+    openai_data = analyzed['openai']
+    deepseek_data = analyzed['deepseek']
+    llama_data = analyzed['llama']
+
+    # Emails analyzed by every model; those also found in a dump file make it into the output
+    common_ids = openai_data.keys() & qwen_data.keys() & deepseek_data.keys() & llama_data.keys()
+
+    # Parse each dump file once, keeping only the records of those emails
+    json_files = 0
+    for file_path in _iter_json_files(input_dir):
+        json_files += 1
         try:
-            #print(f"Processing {file_path}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                email_datas = json.load(f)
+            email_datas = _load_json(file_path)
             # Handle both single email and list of emails
             if not isinstance(email_datas, list):
                 email_datas = [email_datas]
 
             for email_data in email_datas:
-                email_map[email_data['id']] = email_data
+                if email_data['id'] in common_ids:
+                    email_map[email_data['id']] = email_data
         except Exception as e:
             traceback.print_exc()
-            print(f"Error processing {file_path.name}: {e}")
+            print(f"Error processing {os.path.basename(file_path)}: {e}")
             continue
-    print(f"Total emails to process: {len(email_map)}")
-
-    qwen_data = {}
-    with open('./analyzed_emails_qwen.json', 'r', encoding='utf-8') as f:
-        qwen_data = json.load(f)
-    print(f"Total emails to process: {len(qwen_data)}")
-
-    openai_data = {}
-    with open('./analyzed_emails_openai.json', 'r', encoding='utf-8') as f:
-        openai_data = json.load(f)
-    print(f"Total emails to process: {len(openai_data)}")
-
-    deepseek_data = {}
-    with open('./analyzed_emails_deepseek.json', 'r', encoding='utf-8') as f:
-        deepseek_data = json.load(f)
-    print(f"Total emails to process: {len(deepseek_data)}")
 
-    llama_data = {}
-    with open('./analyzed_emails_llama.json', 'r', encoding='utf-8') as f:
-        llama_data = json.load(f)
-    print(f"Total emails to process: {len(llama_data)}")
+    if not json_files:
+        print("No JSON files found")
+        return None
+    print(f"Total emails to process: {len(email_map)}")
 
     output_openai_data = {}
     output_qwen_data = {}
@@ -74,31 +108,30 @@ def trim_data_according_to_openai():
     output_email_data = {}
 
 
-    for email_id, email_data in openai_data.items():
+    # Iterate openai_data for a stable output order; email_map only holds emails in common_ids
+    for email_id in openai_data:
         if email_id in email_map:
-            output_email_data[email_id] = email_map[email_id]
+            # Project a trimmed copy instead of deleting keys from the record held in email_map
+            record = email_map[email_id]
+            trimmed = {k: v for k, v in record.items() if k != 'thread_id'}
+            trimmed['headers'] = {k: v for k, v in record['headers'].items() if k not in TRIMMED_HEADERS}
+            output_email_data[email_id] = trimmed
             output_openai_data[email_id] = openai_data[email_id]
             output_qwen_data[email_id] = qwen_data[email_id]
             output_deepseek_data[email_id] = deepseek_data[email_id]
             output_llama_data[email_id] = llama_data[email_id]
 
-            del output_email_data[email_id]['thread_id']
-            del output_email_data[email_id]['headers']['message-id']
-            del output_email_data[email_id]['headers']['from']
-            del output_email_data[email_id]['headers']['to']
-            del output_email_data[email_id]['headers']['content-type']
-
 
-    with open('./data/analyzed_emails_openai.json', 'w', encoding='utf-8') as f:
-        json.dump(output_openai_data, f, ensure_ascii=False, indent=2)
-    with open('./data/analyzed_emails_qwen.json', 'w', encoding='utf-8') as f:
-        json.dump(output_qwen_data, f, ensure_ascii=False, indent=2)
-    with open('./data/analyzed_emails_deepseek.json', 'w', encoding='utf-8') as f:
-        json.dump(output_deepseek_data, f, ensure_ascii=False, indent=2)
-    with open('./data/analyzed_emails_llama.json', 'w', encoding='utf-8') as f:
-        json.dump(output_llama_data, f, ensure_ascii=False, indent=2)
-    with open('./data/raw_emails.json', 'w', encoding='utf-8') as f:
-        json.dump(output_email_data, f, ensure_ascii=False, indent=2)
+    outputs = {
+        './data/analyzed_emails_openai.json': output_openai_data,
+        './data/analyzed_emails_qwen.json': output_qwen_data,
+        './data/analyzed_emails_deepseek.json': output_deepseek_data,
+        './data/analyzed_emails_llama.json': output_llama_data,
+        './data/raw_emails.json': output_email_data,
+    }
+    with ThreadPoolExecutor(max_workers=len(outputs)) as pool:
+        # list() surfaces any write error
+        list(pool.map(lambda item: _dump_json(*item, pretty=pretty), outputs.items()))
 
 
 
@@ -119,18 +152,16 @@ def analyze(
 ):
     """Analyze email content from JSON dumps using LLM."""
     try:
-        # Process emails
+        from gmail_api.email_analyzer import process_directory
+
+        # Process emails; process_directory checkpoints and saves results to output_file itself
+        output_file.parent.mkdir(parents=True, exist_ok=True)
         results = asyncio.run(process_directory(input_dir, output_file))
 
         if not results:
             print("No emails were successfully processed")
             raise typer.Exit(1)
 
-        # Save results
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-
         # Print summary
         print(f"\nSuccessfully processed {len(results)} emails")
         print(f"Results saved to: {output_file}")
@@ -141,16 +172,34 @@ def analyze(
         raise typer.Exit(1)
 
 
+_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+def _valid_date(value: str) -> bool:
+    """Check that value is a real YYYY-MM-DD calendar date."""
+    match = _DATE_RE.fullmatch(value)
+    if not match:
+        return False
+    try:
+        # Constructing the date directly rejects e.g. 2024-02-30 without strptime's format parsing
+        datetime.date(*map(int, match.groups()))
+    except ValueError:
+        return False
+    return True
+
+
+# Marker preceding the label ID in lines like "- Name (ID: Label_123)"
+_LABEL_ID_MARKER = '(ID: Label_'
+
+
 def __parse_label_line(line: str) -> str:
     """Extract the actual label name from a line that might include ID and prefix."""
     # Remove the leading "- " if present
     line = line.lstrip('- ')
 
     # Extract the label name (everything before " (ID: Label_...")
-    match = re.match(r'^([^(]+?)(?:\s+\(ID: Label_\d+\))?$', line.strip())
-    if match:
-        return match.group(1).strip()
-    return line.strip()
+    name, _, _ = line.partition(_LABEL_ID_MARKER)
+    return name.strip()
 
 @app.command()
 def dump_emails(
@@ -163,15 +212,17 @@ def dump_emails(
     Dump emails with specified labels to JSON files.
     """
     try:
+        from gmail_api.auth import get_gmail_service, build_gmail_service
+        from gmail_api.email_dumper import EmailDumper
+
         # Set verbose flag
         if verbose:
             print("Verbose mode enabled")
 
         # Read and parse labels from file
         print("Reading labels file...")
-        with open(labels_file, 'r') as f:
-            labels = [__parse_label_line(line) for line in f if line.strip()]
-            labels = [label for label in labels if label]  # Remove any empty results
+        lines = Path(labels_file).read_text(encoding='utf-8').splitlines()
+        labels = [label for label in map(__parse_label_line, lines) if label]  # Remove any empty results
 
         if not labels:
             print("No labels found in the input file")
@@ -188,13 +239,12 @@ def dump_emails(
             print("Failed to get Gmail credentials")
             raise typer.Exit(1)
 
-        service = build('gmail', 'v1', credentials=credentials)
+        service = build_gmail_service(credentials)
         dumper = EmailDumper(service)
 
         # Create output directory
         print("Creating output directory...")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
 
         # Dump emails
         print("Starting email dump...")
@@ -212,6 +262,68 @@ def dump_emails(
         raise typer.Exit(1)
 
 
+def _run_date_range(action: str, fn, start_date: str, end_date: str, verbose: bool, **kwargs):
+    """
+    Validate a YYYY-MM-DD date range and run fn over it, with shared error handling.
+
+    Args:
+        action: What the command does, used in messages (e.g. "analyzing emails")
+        fn: Callable taking start_date, end_date, verbose and kwargs; coroutines are run with asyncio
+        start_date: Start date in format YYYY-MM-DD
+        end_date: End date in format YYYY-MM-DD
+        verbose: Enable verbose logging
+        kwargs: Extra keyword arguments passed to fn
+
+    Returns:
+        Whatever fn returns
+    """
+    if not (_valid_date(start_date) and _valid_date(end_date)):
+        print(f"Invalid date format: {start_date}, {end_date}")
+        print("Please use YYYY-MM-DD format")
+        raise typer.Exit(1)
+
+    if verbose:
+        print(f"{action.capitalize()} from {start_date} to {end_date}")
+        for name, value in kwargs.items():
+            print(f"  {name}: {value}")
+
+    try:
+        result = fn(start_date=start_date, end_date=end_date, verbose=verbose, **kwargs)
+        if asyncio.iscoroutine(result):
+            result = asyncio.run(result)
+        return result
+    except typer.Exit:
+        raise
+    except Exception as e:
+        print(f"Error {action}: {str(e)}")
+        print("Stack trace:")
+        traceback.print_exc()
+        raise typer.Exit(1)
+
+
+def _dump_date_range(start_date: str, end_date: str, verbose: bool, output_dir: str, overwrite: bool):
+    """Authenticate with Gmail and dump the emails of a date range."""
+    from gmail_api.auth import get_gmail_service, build_gmail_service
+    from gmail_api.email_dumper import EmailDumper
+
+    if verbose:
+        print(f"Authenticating with Gmail API...")
+
+    creds = get_gmail_service()
+    if not creds:
+        print("Failed to authenticate with Gmail API")
+        raise typer.Exit(1)
+
+    dumper = EmailDumper(build_gmail_service(creds))
+    return dumper.dump_emails_by_date_range(
+        start_date=start_date,
+        end_date=end_date,
+        output_dir=output_dir,
+        overwrite=overwrite,
+        verbose=verbose
+    )
+
+
 """
 python main_cli.py dump-emails-by-date 2024-01-01 2024-01-31 --output-dir email_dumps --verbose
 """
@@ -227,45 +339,16 @@ def dump_emails_by_date(
     Dump all emails within a specified date range to JSON files.
     Files will be organized in directories: output_dir/YYYY/MM/DD/email_id.json
     """
-    try:
-        # Validate date format
-        try:
-            datetime.datetime.strptime(start_date, "%Y-%m-%d")
-            datetime.datetime.strptime(end_date, "%Y-%m-%d")
-        except ValueError as e:
-            print(f"Invalid date format. Please use YYYY-MM-DD format. Error: {e}")
-            return
+    created_files = _run_date_range("dumping emails", _dump_date_range, start_date, end_date, verbose,
+                                    output_dir=output_dir, overwrite=overwrite)
+    if verbose:
+        print(f"Successfully dumped {len(created_files)} emails")
 
-        if verbose:
-            print(f"Authenticating with Gmail API...")
-
-        creds = get_gmail_service()
-        if not creds:
-            print("Failed to authenticate with Gmail API")
-            return
-
-        service = build('gmail', 'v1', credentials=creds)
-        dumper = EmailDumper(service)
 
-        if verbose:
-            print(f"Dumping emails from {start_date} to {end_date}")
-            print(f"Output directory: {output_dir}")
-
-        created_files = dumper.dump_emails_by_date_range(
-            start_date=start_date,
-            end_date=end_date,
-            output_dir=output_dir,
-            overwrite=overwrite,
-            verbose=verbose
-        )
-
-        if verbose:
-            print(f"Successfully dumped {len(created_files)} emails")
-
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        print("Stack trace:")
-        print(traceback.format_exc())
+def _analyze_date_range(**kwargs):
+    """Analyze the dumped emails of a date range with the LLM."""
+    from gmail_api.email_analyzer import process_date_range
+    return process_date_range(**kwargs)
 
 
 @app.command()
@@ -281,38 +364,30 @@ def analyze_emails_by_date(
     Analyze emails within a specified date range.
     Files will be analyzed and saved as: output_dir/YYYY/MM/DD/email_id_analyzed.json
     """
-    try:
-        # Validate date format
-        try:
-            datetime.datetime.strptime(start_date, "%Y-%m-%d")
-            datetime.datetime.strptime(end_date, "%Y-%m-%d")
-        except ValueError as e:
-            print(f"Invalid date format: {e}")
-            print("Please use YYYY-MM-DD format")
-            raise typer.Exit(1)
+    result = _run_date_range("analyzing emails", _analyze_date_range, start_date, end_date, verbose,
+                             input_dir=input_dir, output_dir=output_dir, overwrite=overwrite)
+    print(f"Successfully analyzed {len(result)} emails")
 
-        if verbose:
-            print(f"Analyzing emails from {start_date} to {end_date}")
-            print(f"Input directory: {input_dir}")
-            print(f"Output directory: {output_dir or input_dir}")
-
-        # Process emails
-        result = asyncio.run(process_date_range(
-            input_dir=input_dir,
-            start_date=start_date,
-            end_date=end_date,
-            output_dir=output_dir,
-            overwrite=overwrite,
-            verbose=verbose
-        ))
-
-        print(f"Successfully analyzed {len(result)} emails")
 
-    except Exception as e:
-        print(f"Error analyzing emails: {str(e)}")
-        print("Stack trace:")
-        print(traceback.format_exc())
-        raise typer.Exit(1)
+def _launch_weekly_report(start_date: str, end_date: str, verbose: bool, input_dir: str, overwrite: bool):
+    """Run weekly_report/report_app.py under Streamlit with the given arguments."""
+    import sys
+    import streamlit.web.cli as stcli
+
+    # Create a new sys.argv for Streamlit, in the flag format report_app.py parses
+    sys.argv = [
+        "streamlit",
+        "run",
+        os.path.join(os.path.dirname(__file__), "weekly_report", "report_app.py"),
+        "--",
+        "--start-date", start_date,
+        "--end-date", end_date,
+        "--input-dir", input_dir,
+    ]
+    if overwrite:
+        sys.argv.append("--overwrite")
+
+    sys.exit(stcli.main())
 
 
 @app.command()
@@ -326,86 +401,9 @@ def weekly_report(
     """
     Start a Streamlit app to generate and edit weekly reports for emails within a date range.
     """
-    try:
-        if verbose:
-            print(f"Starting weekly report app for date range {start_date} to {end_date}")
-            print(f"Input directory: {input_dir}")
-
-        import sys
-        import streamlit.web.cli as stcli
-
-        # Create a new sys.argv for Streamlit
-        sys.argv = [
-            "/Users/tinge/work/tinge/agent/venv/funsense_env/bin/streamlit",
-            "run",
-            os.path.join(os.path.dirname(__file__), "weekly_report", "report_app.py"),
-            "--",
-            input_dir,
-            start_date,
-            end_date,
-            str(overwrite)
-        ]
-
-        sys.exit(stcli.main())
-    except Exception as e:
-        print(traceback.format_exc())
-        raise typer.Exit(1)
-
-@app.command()
-def dump(
-    start_date: str = typer.Option(..., help="Start date in YYYY-MM-DD format"),
-    end_date: str = typer.Option(..., help="End date in YYYY-MM-DD format"),
-    output_dir: str = typer.Option(..., help="Directory to save email dumps"),
-    overwrite: bool = typer.Option(False, help="Whether to overwrite existing files"),
-    verbose: bool = typer.Option(False, help="Enable verbose logging")
-):
-    """Dump emails from Gmail API."""
-    try:
-        from gmail_api.email_dumper import dump_emails
-        dump_emails(start_date, end_date, output_dir, overwrite, verbose)
-    except Exception as e:
-        print(f"Error dumping emails: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        raise typer.Exit(1)
-
-@app.command()
-def analyze(
-    start_date: str = typer.Option(..., help="Start date in YYYY-MM-DD format"),
-    end_date: str = typer.Option(..., help="End date in YYYY-MM-DD format"),
-    input_dir: str = typer.Option(..., help="Directory containing email dumps"),
-    overwrite: bool = typer.Option(False, help="Whether to overwrite existing files"),
-    verbose: bool = typer.Option(False, help="Enable verbose logging")
-):
-    """Analyze dumped emails."""
-    try:
-        from gmail_api.email_analyzer import analyze_emails
-        analyze_emails(start_date, end_date, input_dir, overwrite, verbose)
-    except Exception as e:
-        print(f"Error analyzing emails: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        raise typer.Exit(1)
+    _run_date_range("starting weekly report app", _launch_weekly_report, start_date, end_date, verbose,
+                    input_dir=input_dir, overwrite=overwrite)
 
-@app.command()
-def weekly_report(
-    start_date: str = typer.Option(..., help="Start date in YYYY-MM-DD format"),
-    end_date: str = typer.Option(..., help="End date in YYYY-MM-DD format"),
-    input_dir: str = typer.Option(..., help="Directory containing email dumps"),
-    overwrite: bool = typer.Option(False, help="Whether to overwrite existing files"),
-    verbose: bool = typer.Option(False, help="Enable verbose logging")
-):
-    """Start a Streamlit app to edit weekly report."""
-    try:
-        from weekly_report.report_app import run_app
-        print(f"Starting weekly report app for date range {start_date} to {end_date}")
-        print(f"Input directory: {input_dir}")
-        run_app(input_dir, start_date, end_date, overwrite)
-    except Exception as e:
-        print(f"Error running weekly report app: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        raise typer.Exit(1)
 
 @app.command()
 def convert_pdf(
@@ -420,6 +418,8 @@ def convert_pdf(
 ):
     """Convert a PDF file to markdown using the Marker API."""
     try:
+        from tools.pdf.pdf_parser import parse_pdf
+
         print(f"Converting PDF: {pdf_path}")
         result = parse_pdf(
             pdf_path=pdf_path,
@@ -442,7 +442,7 @@ def convert_pdf(
                 print(f"Markdown content saved to: {output_file}")
             except Exception as e:
                 print(f"Error saving output file: {e}")
-                print(traceback.format_exc())
+                traceback.print_exc()
                 raise typer.Exit(1)
         else:
             print("\nMarkdown Content:")
@@ -450,7 +450,7 @@ def convert_pdf(
             print(result.output)
     except Exception as e:
         print(f"Error converting PDF: {e}")
-        print(traceback.format_exc())
+        traceback.print_exc()
         raise typer.Exit(1)
 
 
@@ -0,0 +1,57 @@
+"""
+Tests for the date-range directory walk in gmail_api/email_analyzer.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, project_root)
+
+from gmail_api.email_analyzer import iter_day_dirs
+
+
+def _make_dirs(root, *day_paths):
+    for day_path in day_paths:
+        os.makedirs(os.path.join(root, *day_path.split('/')), exist_ok=True)
+
+
+def test_iter_day_dirs_filters_and_sorts():
+    """Only existing days inside the inclusive range are yielded, in date order."""
+    with tempfile.TemporaryDirectory() as root:
+        _make_dirs(root, '2023/12/31', '2024/01/02', '2024/01/10', '2024/02/01', '2024/02/30', '2024/03/01')
+        # Non-numeric entries are ignored
+        _make_dirs(root, '2024/notes', '2024/01/tmp')
+        open(os.path.join(root, '2024', '01', '05'), 'w').close()
+
+        result = list(iter_day_dirs(root, datetime(2024, 1, 1), datetime(2024, 2, 29)))
+
+        assert [dt for _, dt in result] == [datetime(2024, 1, 2), datetime(2024, 1, 10), datetime(2024, 2, 1)]
+        assert result[0][0] == os.path.join(root, '2024', '01', '02')
+
+
+def test_iter_day_dirs_missing_root():
+    """A missing root yields nothing instead of raising."""
+    with tempfile.TemporaryDirectory() as root:
+        missing = os.path.join(root, 'missing')
+        assert list(iter_day_dirs(missing, datetime(2024, 1, 1), datetime(2024, 12, 31))) == []
+
+
+def test_iter_day_dirs_follows_symlinked_days():
+    """Day directories reached through a symlink are walked like real ones."""
+    with tempfile.TemporaryDirectory() as root:
+        _make_dirs(root, 'archive/15', '2024/01')
+        os.symlink(os.path.join(root, 'archive', '15'), os.path.join(root, '2024', '01', '15'))
+
+        result = list(iter_day_dirs(root, datetime(2024, 1, 1), datetime(2024, 1, 31)))
+
+        assert [dt for _, dt in result] == [datetime(2024, 1, 15)]
+
+
+if __name__ == "__main__":
+    test_iter_day_dirs_filters_and_sorts()
+    test_iter_day_dirs_missing_root()
+    test_iter_day_dirs_follows_symlinked_days()
+    print("✅ iter_day_dirs tests passed")
@@ -0,0 +1,33 @@
+"""
+Tests for the CLI date validation in main_cli.py
+"""
+import os
+import sys
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, project_root)
+
+from main_cli import _valid_date
+
+
+def test_valid_date_accepts_calendar_dates():
+    for value in ('2024-01-01', '2024-02-29', '1999-12-31'):
+        assert _valid_date(value), value
+
+
+def test_valid_date_rejects_impossible_days():
+    for value in ('2024-02-30', '2023-02-29', '2024-04-31', '2024-13-01', '2024-00-10', '2024-01-00'):
+        assert not _valid_date(value), value
+
+
+def test_valid_date_rejects_other_formats():
+    for value in ('2024-1-01', '2024/01/01', '20240101', '2024-01-01T00:00', ' 2024-01-01', '2024-01-01\n', ''):
+        assert not _valid_date(value), value
+
+
+if __name__ == "__main__":
+    test_valid_date_accepts_calendar_dates()
+    test_valid_date_rejects_impossible_days()
+    test_valid_date_rejects_other_formats()
+    print("✅ _valid_date tests passed")
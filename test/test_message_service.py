@@ -0,0 +1,90 @@
+"""
+Tests for the Gmail body decoding in gmail_api/message_service.py
+"""
+import base64
+import os
+import sys
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, project_root)
+
+from gmail_api.message_service import MessageService, _b64url_decode, _extract_text
+
+
+def test_b64url_decode_stripped_padding():
+    """Gmail drops the '=' padding; every remainder length must still decode."""
+    for data in (b'', b'a', b'ab', b'abc', b'abcd', 'héllo wörld ✓'.encode('utf-8')):
+        encoded = base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+        assert _b64url_decode(encoded) == data
+
+
+def test_b64url_decode_urlsafe_alphabet():
+    """'-' and '_' decode as the standard alphabet's '+' and '/'."""
+    data = bytes(range(256))
+    encoded = base64.urlsafe_b64encode(data).decode('ascii')
+    assert '-' in encoded and '_' in encoded
+    assert _b64url_decode(encoded) == data
+
+
+def _raw_message(source: bytes):
+    """Wrap an RFC 2822 source the way messages.get(format='raw') returns it."""
+    raw = base64.urlsafe_b64encode(source).decode('ascii').rstrip('=')
+    return {'id': 'm1', 'threadId': 't1', 'raw': raw}
+
+
+def test_raw_body_skips_text_attachments():
+    """Raw mode keeps inline text/plain parts only, matching full mode's _extract_text."""
+    source = (
+        b'Subject: hi\r\n'
+        b'MIME-Version: 1.0\r\n'
+        b'Content-Type: multipart/mixed; boundary=XX\r\n'
+        b'\r\n'
+        b'--XX\r\n'
+        b'Content-Type: text/plain; charset=utf-8\r\n'
+        b'\r\n'
+        b'hello\r\n'
+        b'--XX\r\n'
+        b'Content-Type: text/plain; charset=utf-8\r\n'
+        b'Content-Disposition: attachment; filename=a.txt\r\n'
+        b'\r\n'
+        b'ATTACH\r\n'
+        b'--XX--\r\n'
+    )
+    email_data = MessageService(None)._raw_to_email_data(_raw_message(source))
+    assert email_data['subject'] == 'hi'
+    assert email_data['body'] == 'hello'
+
+    # The same message in format='full': the attachment has an attachmentId and no inline data
+    payload = {
+        'mimeType': 'multipart/mixed',
+        'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': base64.urlsafe_b64encode(b'hello').decode('ascii')}},
+            {'mimeType': 'text/plain', 'filename': 'a.txt', 'body': {'attachmentId': 'att1', 'size': 6}},
+        ]
+    }
+    buf = bytearray()
+    _extract_text(payload, buf)
+    assert buf.decode('utf-8') == email_data['body']
+
+
+def test_raw_body_unknown_charset_falls_back_to_utf8():
+    """A part with an unknown charset is decoded as UTF-8 instead of failing the message."""
+    source = (
+        b'Subject: charset\r\n'
+        b'MIME-Version: 1.0\r\n'
+        b'Content-Type: text/plain; charset=x-unknown\r\n'
+        b'Content-Transfer-Encoding: 8bit\r\n'
+        b'\r\n'
+        b'caf\xc3\xa9 \xff\r\n'
+    )
+    email_data = MessageService(None)._raw_to_email_data(_raw_message(source))
+    assert email_data['body'] == 'caf\u00e9 \ufffd\r\n'
+
+
+if __name__ == "__main__":
+    test_b64url_decode_stripped_padding()
+    test_b64url_decode_urlsafe_alphabet()
+    test_raw_body_skips_text_attachments()
+    test_raw_body_unknown_charset_falls_back_to_utf8()
+    print("✅ message_service decoding tests passed")
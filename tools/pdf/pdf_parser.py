@@ -6,6 +6,8 @@ import os
 import sys
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
 import traceback
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
@@ -16,6 +18,12 @@ from tools.pdf.pdf_response_model import PdfServiceResponse
 # Load environment variables
 load_dotenv(override=True)
 
+# Shared session so repeated parse_pdf calls reuse pooled keep-alive connections to the Marker API
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
 
 def parse_pdf(
     pdf_path: str,
@@ -48,7 +56,6 @@ def parse_pdf(
     endpoint = f"{api_url}/marker/upload"
     
     # Prepare the form data
-    files = {"file": open(pdf_path, "rb")}
     data = {
         "page_range": page_range,
         "languages": languages,
@@ -62,19 +69,21 @@ def parse_pdf(
     
     try:
         print(f"Parsing PDF: {pdf_path}")
-        response = requests.post(endpoint, files=files, data=data)
-        
-        # Close the file
-        files["file"].close()
+        # Stream the PDF from disk instead of building the whole multipart body in memory
+        with open(pdf_path, "rb") as pdf_file:
+            encoder = MultipartEncoder(fields={
+                **data,
+                "file": (os.path.basename(pdf_path), pdf_file, "application/pdf")
+            })
+            response = _SESSION.post(endpoint, data=encoder, headers={"Content-Type": encoder.content_type})
         
         if response.status_code != 200:
             print(f"Error: API returned status code {response.status_code}")
             print(f"Response: {response.text}")
             sys.exit(1)
         
-        result = response.json()
-        # Parse the response using our PdfServiceResponse model
-        return PdfServiceResponse.model_validate(result)
+        # Parse and validate the raw response bytes in one pass with pydantic's JSON parser
+        return PdfServiceResponse.model_validate_json(response.content)
     
     except Exception as e:
         print(f"Error parsing PDF: {e}")
@@ -8,10 +8,11 @@ from delorean import Delorean
 from pydantic import BaseModel, field_validator, Field
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for importing modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gmail_api.email_analyzer import translate_from_cn_to_en, translate_from_en_to_cn
+from gmail_api.email_analyzer import translate_from_cn_to_en, translate_from_en_to_cn, iter_day_dirs
 
 
 class WeeklyPost(BaseModel):
@@ -61,45 +62,19 @@ def load_analyzed_emails(input_dir: str, start_date: str, end_date: str) -> List
     start_date_obj = datetime.datetime.strptime(start_date, "%Y-%m-%d")
     end_date_obj = datetime.datetime.strptime(end_date, "%Y-%m-%d")
 
-    # Iterate through directory structure: year/month/day
-    for year in range(start_date_obj.year, end_date_obj.year + 1):
-        year_dir = os.path.join(input_dir, str(year))
-        if not os.path.exists(year_dir):
-            continue
-
-        for month in range(1, 13):
-            # Skip months outside date range
-            if year == start_date_obj.year and month < start_date_obj.month:
-                continue
-            if year == end_date_obj.year and month > end_date_obj.month:
-                continue
-
-            month_dir = os.path.join(year_dir, f"{month:02d}")
-            if not os.path.exists(month_dir):
-                continue
-
-            for day in range(1, 32):
-                # Skip days outside date range
-                if year == start_date_obj.year and month == start_date_obj.month and day < start_date_obj.day:
-                    continue
-                if year == end_date_obj.year and month == end_date_obj.month and day > end_date_obj.day:
-                    continue
-
-                day_dir = os.path.join(month_dir, f"{day:02d}")
-                if not os.path.exists(day_dir):
-                    continue
-
-                # Load all analyzed JSON files in the day directory
-                for filename in os.listdir(day_dir):
-                    if filename.endswith("_analyzed.json"):
-                        file_path = os.path.join(day_dir, filename)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as file:
-                                email_data = json.load(file)
-                                email_data_list.append(email_data)
-                        except Exception as e:
-                            print(f"Error loading file {file_path}: {e}")
-                            print(traceback.format_exc())
+    # Iterate through the existing year/month/day directories in range
+    for day_dir, _ in iter_day_dirs(input_dir, start_date_obj, end_date_obj):
+        # Load all analyzed JSON files in the day directory
+        with os.scandir(day_dir) as entries:
+            analyzed_paths = [entry.path for entry in entries if entry.name.endswith("_analyzed.json")]
+        for file_path in analyzed_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    email_data = json.load(file)
+                    email_data_list.append(email_data)
+            except Exception as e:
+                print(f"Error loading file {file_path}: {e}")
+                print(traceback.format_exc())
 
     return email_data_list
 
@@ -135,6 +110,12 @@ def convert_to_weekly_post(email_data: Dict[str, Any]) -> WeeklyPost:
     )
 
 
+def translate_fields(translate, texts: List[str]) -> List[str]:
+    """Translate several fields concurrently, leaving empty ones untouched."""
+    with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+        return list(executor.map(lambda text: translate(text) if text.strip() else text, texts))
+
+
 def download_image(url: str, save_path: str) -> bool:
     """Download an image from a URL and save it to the specified path."""
     try:
@@ -529,9 +510,8 @@ def _render_sidebar_actions(report: WeeklyReport, target_file: str, week_number:
     # Save report button
     if st.button(" Save Report", type="primary", use_container_width=True):
         try:
-            report_dict = report.model_dump()
             with open(target_file, 'w', encoding='utf-8') as f:
-                json.dump(report_dict, f, ensure_ascii=False, indent=2)
+                f.write(report.model_dump_json(indent=2))
             st.success("Saved report successfully!")
             print(f"Saved report to {target_file}")
             # Force reload of the report
@@ -767,9 +747,11 @@ def _render_post_content(post: WeeklyPost, index: int, post_key: str) -> None:
                     use_container_width=True,
                     help="Translate all Chinese content to English"):
             with st.spinner("Translating all content..."):
-                st.session_state[post_key].title_en = translate_from_cn_to_en(st.session_state[post_key].title_cn)
-                st.session_state[post_key].post_content_en = translate_from_cn_to_en(st.session_state[post_key].post_content_cn)
-                st.session_state[post_key].user_input_en = translate_from_cn_to_en(st.session_state[post_key].user_input_cn)
+                post_state = st.session_state[post_key]
+                post_state.title_en, post_state.post_content_en, post_state.user_input_en = translate_fields(
+                    translate_from_cn_to_en,
+                    [post_state.title_cn, post_state.post_content_cn, post_state.user_input_cn]
+                )
                 st.rerun()
 
     with col2:
@@ -823,9 +805,11 @@ def _render_post_content(post: WeeklyPost, index: int, post_key: str) -> None:
                     use_container_width=True,
                     help="Translate all English content to Chinese"):
             with st.spinner("Translating all content..."):
-                st.session_state[post_key].title_cn = translate_from_en_to_cn(st.session_state[post_key].title_en)
-                st.session_state[post_key].post_content_cn = translate_from_en_to_cn(st.session_state[post_key].post_content_en)
-                st.session_state[post_key].user_input_cn = translate_from_en_to_cn(st.session_state[post_key].user_input_en)
+                post_state = st.session_state[post_key]
+                post_state.title_cn, post_state.post_content_cn, post_state.user_input_cn = translate_fields(
+                    translate_from_en_to_cn,
+                    [post_state.title_en, post_state.post_content_en, post_state.user_input_en]
+                )
                 st.rerun()
 
     # Labels and Links